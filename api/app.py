@@ -1,202 +1,517 @@
 from flask import Flask, request, jsonify
 import os
+import hashlib
+import io
 import json
-import traceback
-import openpyxl
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
-from google.oauth2 import service_account
+import logging
+import math
+import re
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
 import time
-import signal
-from functools import wraps
-from threading import Thread
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import parse_qsl
+from threading import Lock, RLock, local
 
 app = Flask(__name__)
 
-# Set request timeout (in seconds)
+# Logging level for app.logger; INFO adds one line per processed file, DEBUG dumps requests
+app.logger.setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
+
+# Socket timeout for each Drive API call (in seconds)
 REQUEST_TIMEOUT = 30
 
+# Retries with backoff for Drive calls failing on connection errors, 5xx or rate limits
+DRIVE_RETRIES = 2
+
 # Google Drive API scope
 SCOPES = ['https://www.googleapis.com/auth/drive']
 
-# Map of input fields to Excel cell references
-EXCEL_CELL_MAP = {
-    "projectName": "D29",  # Merged cells D29:G29
-    "projectNumber": "D8",  # Merged cells D8:F8
-    "branch": "D6"  # Merged cells D6:G6
+# Input fields and the Excel cell references they map to
+EXCEL_CELL_MAP = (
+    ("projectName", "D29"),  # Merged cells D29:G29
+    ("projectNumber", "D8"),  # Merged cells D8:F8
+    ("branch", "D6")  # Merged cells D6:G6
+)
+
+# Largest workbook accepted for update, checked against Drive metadata before download (0 disables the check)
+MAX_XLSX_BYTES = int(os.environ.get('MAX_XLSX_BYTES', 25 * 1024 * 1024))
+
+# Drive MIME types of workbooks that can be updated, lowercased as MIME types are case-insensitive
+EXCEL_MIME_TYPES = {
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.ms-excel.sheet.macroenabled.12'
 }
 
-def timeout_handler(signum, frame):
-    raise TimeoutError("Request timed out")
+# Generic MIME types Drive may store workbooks under; these are downloaded and validated as zips
+GENERIC_MIME_TYPES = {'application/octet-stream'}
+
+# Workbooks smaller than this are uploaded in a single multipart request
+RESUMABLE_UPLOAD_THRESHOLD = 5 * 1024 * 1024
+
+# Chunk size for resumable uploads and downloads (must be a multiple of 256KB)
+TRANSFER_CHUNK_SIZE = 8 * 1024 * 1024
+
+# How workbooks are updated: 'zip' patches the sheet XML directly (falling back to
+# openpyxl when it can't), 'openpyxl' always loads and re-saves the whole workbook
+EXCEL_UPDATE_ENGINE = os.environ.get('EXCEL_UPDATE_ENGINE', 'zip')
+
+# Sheet holding the cells in EXCEL_CELL_MAP
+SHEET_NAME = 'Project Setup Form'
+
+# Matches any EXCEL_CELL_MAP cell element in worksheet XML, capturing its reference
+CELL_PATTERN = re.compile(
+    r'<c\b[^>]*?\sr="(%s)"[^>]*?(?:/>|>.*?</c>)' % '|'.join(cell_ref for _, cell_ref in EXCEL_CELL_MAP),
+    re.S
+)
+CELL_OPEN_TAG_PATTERN = re.compile(r'<c\b[^>]*')
+CELL_STYLE_PATTERN = re.compile(r'\ss="\d+"')
+
+# Control characters XML cannot represent, as rejected by openpyxl (ILLEGAL_CHARACTERS_RE)
+ILLEGAL_CHARACTERS_PATTERN = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
+
+# Workbook parts that are already compressed, so they are stored rather than deflated again
+PRECOMPRESSED_SUFFIXES = ('.png', '.jpeg', '.jpg', '.gif')
+
+# Parts openpyxl only copies into the saved workbook when loaded with keep_vba
+# (macros, form controls, ActiveX and ribbon customisations)
+KEEP_VBA_PART_PATTERN = re.compile(
+    r'xl/vba|xl/drawings/.*vmlDrawing\d\.vml|xl/ctrlProps|customUI|xl/activeX|xl/media/.*\.emf'
+)
+
+# XML namespaces used to locate a sheet inside the xlsx package
+SPREADSHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELATIONSHIP_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PACKAGE_RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+# Seconds during which a repeated identical webhook delivery is ignored
+DUPLICATE_WEBHOOK_TTL = 30
+
+# Last accepted webhook per file, file ID -> (payload hash, time accepted), oldest first
+_RECENT_WEBHOOKS = {}
+_RECENT_WEBHOOKS_LOCK = Lock()
+
+# Background pool for webhook updates, bounding how many workbooks are processed at once
+EXECUTOR = ThreadPoolExecutor(max_workers=int(os.environ.get('WORKER_THREADS', 4)))
+atexit.register(EXECUTOR.shutdown, wait=True)
+
+# Per-file locks serializing updates to the same workbook, file ID -> (lock, holders and waiters).
+# Like the pending and recent webhook state, these only cover this process (see gunicorn.conf.py)
+_FILE_LOCKS = {}
+_FILE_LOCKS_LOCK = Lock()
+
+# Webhook updates queued but not yet started, file ID -> (merged data, webhook keys)
+_PENDING = {}
+_PENDING_LOCK = Lock()
+
+# Drive credentials and service, built once per process by get_service()
+_CREDENTIALS = None
+_SERVICE = None
+_SERVICE_LOCK = Lock()
+
+# Authorized HTTP transport for Drive calls, one per thread so connections are kept alive
+_THREAD_HTTP = local()
+
+class FileRejected(ValueError):
+    """Raised when a Drive file is not a workbook that should be downloaded and updated."""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
 
 def authenticate():
     """Authenticate with Google Drive API using service account."""
+    from google.oauth2 import service_account
+
     try:
         # Get service account JSON from environment variable
         service_account_info = json.loads(os.environ.get("GOOGLE_SERVICE_ACCOUNT_JSON"))
-        app.logger.info(f"Authenticating with service account: {service_account_info.get('client_email', 'unknown')}")
+        app.logger.info("Authenticating with service account: %s", service_account_info.get('client_email', 'unknown'))
         
         credentials = service_account.Credentials.from_service_account_info(
             service_account_info, scopes=SCOPES)
         return credentials
     except Exception as e:
-        app.logger.error(f"Authentication error: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        app.logger.error("Authentication error: %s", e)
         raise
 
+def _build_request(http, *args, **kwargs):
+    """Run every Drive request on its thread's own authorized transport, as httplib2 is not thread-safe."""
+    import google_auth_httplib2
+    import httplib2
+    from googleapiclient.http import HttpRequest
+
+    authed_http = getattr(_THREAD_HTTP, 'http', None)
+    if authed_http is None:
+        authed_http = _THREAD_HTTP.http = google_auth_httplib2.AuthorizedHttp(
+            _CREDENTIALS,
+            http=httplib2.Http(timeout=REQUEST_TIMEOUT)
+        )
+    return HttpRequest(authed_http, *args, **kwargs)
+
+def get_service():
+    """Return the cached Drive service, building it on first use."""
+    # Google client libraries are imported lazily so health checks don't pay for them
+    from googleapiclient.discovery import build
+
+    global _CREDENTIALS, _SERVICE
+    if _SERVICE is None:
+        with _SERVICE_LOCK:
+            if _SERVICE is None:
+                _CREDENTIALS = authenticate()
+                _SERVICE = build(
+                    'drive', 'v3',
+                    credentials=_CREDENTIALS,
+                    requestBuilder=_build_request,
+                    cache_discovery=False,
+                    static_discovery=True
+                )
+    return _SERVICE
+
+def parse_raw_data(request):
+    """Parse URL-encoded data sent with a mismatched Content-Type"""
+    return dict(parse_qsl(request.get_data(cache=False, as_text=True)))
+
+def parse_json_data(request):
+    """Parse a JSON body, falling back to URL-encoded data mislabelled as JSON"""
+    return request.get_json(silent=True) or parse_raw_data(request)
+
+def parse_form_data(request):
+    """Return the form data Werkzeug has already parsed"""
+    return request.form.to_dict()
+
+# Body parsers by form mimetype; JSON types (including application/*+json) are checked first,
+# and anything else is tried as URL-encoded data
+REQUEST_PARSERS = {
+    'application/x-www-form-urlencoded': parse_form_data,
+    'multipart/form-data': parse_form_data
+}
+
 def parse_request_data(request):
     """Helper function to parse request data from various formats"""
-    data = {}
-    raw_data = request.get_data(as_text=True)
-    
-    # First check if we have form data
-    if request.form:
-        data = request.form.to_dict()
-        app.logger.info(f"Parsed form data: {data}")
-    # Then check for URL-encoded data with mismatched Content-Type
-    elif "=" in raw_data and "&" in raw_data:
-        # Parse URL-encoded data manually
-        from urllib.parse import parse_qs
-        parsed_data = parse_qs(raw_data)
-        # Convert from lists to single values
-        data = {k: v[0] for k, v in parsed_data.items()}
-        app.logger.info(f"Parsed URL-encoded data: {data}")
-    # Finally try JSON parsing
-    elif raw_data:
-        try:
-            data = request.json
-            app.logger.info(f"Parsed JSON data: {data}")
-        except:
-            app.logger.warning("Failed to parse as JSON")
-            
-    app.logger.info(f"Processed webhook data: {data}")
+    if request.is_json:
+        data = parse_json_data(request)
+    else:
+        data = REQUEST_PARSERS.get(request.mimetype, parse_raw_data)(request)
+    app.logger.debug("Parsed webhook data: %s", data)
     return data
 
 
-def download_excel(service, file_id, download_path):
-    """Download Excel file from Google Drive with timeout handling."""
+def webhook_key(file_id, data):
+    """Identify a webhook delivery by its file ID and payload."""
+    payload = json.dumps(data, sort_keys=True, default=str).encode('utf-8')
+    return file_id, hashlib.sha1(payload).digest()
+
+def is_duplicate_webhook(key):
+    """
+    Record a webhook delivery, returning True if it repeats the last one accepted for its file
+    within DUPLICATE_WEBHOOK_TTL.
+    """
+    file_id, payload_hash = key
+    now = time.monotonic()
+    with _RECENT_WEBHOOKS_LOCK:
+        # Entries are kept in acceptance order, so expired ones are at the front
+        while _RECENT_WEBHOOKS:
+            oldest_file_id = next(iter(_RECENT_WEBHOOKS))
+            if now - _RECENT_WEBHOOKS[oldest_file_id][1] <= DUPLICATE_WEBHOOK_TTL:
+                break
+            del _RECENT_WEBHOOKS[oldest_file_id]
+
+        # Only a repeat of the latest delivery is dropped, so a change back to earlier values still runs
+        last = _RECENT_WEBHOOKS.get(file_id)
+        if last is not None and last[0] == payload_hash:
+            return True
+        _RECENT_WEBHOOKS.pop(file_id, None)
+        _RECENT_WEBHOOKS[file_id] = (payload_hash, now)
+        return False
+
+def forget_webhook(key):
+    """Let a webhook delivery be processed again, e.g. after it failed."""
+    file_id, payload_hash = key
+    with _RECENT_WEBHOOKS_LOCK:
+        # Leave a later delivery for the file recorded
+        last = _RECENT_WEBHOOKS.get(file_id)
+        if last is not None and last[0] == payload_hash:
+            del _RECENT_WEBHOOKS[file_id]
+
+@contextmanager
+def file_lock(file_id):
+    """Hold the lock for a Drive file so concurrent updates to it run one after another."""
+    with _FILE_LOCKS_LOCK:
+        lock, users = _FILE_LOCKS.get(file_id, (None, 0))
+        if lock is None:
+            lock = RLock()
+        _FILE_LOCKS[file_id] = (lock, users + 1)
+    try:
+        with lock:
+            yield
+    finally:
+        with _FILE_LOCKS_LOCK:
+            lock, users = _FILE_LOCKS[file_id]
+            if users == 1:
+                del _FILE_LOCKS[file_id]
+            else:
+                _FILE_LOCKS[file_id] = (lock, users - 1)
+
+def queue_excel_update(file_id, data, key):
+    """
+    Queue a webhook update for background processing, merging it into an update already pending for the same file.
+    Returns True if a new job was submitted, False if the update was merged.
+    """
+    with _PENDING_LOCK:
+        pending = _PENDING.get(file_id)
+        if pending is not None:
+            # Later non-empty values win, matching the order the updates would have been applied
+            pending[0].update((field, value) for field, value in data.items() if value)
+            pending[1].append(key)
+            return False
+        _PENDING[file_id] = (dict(data), [key])
+    EXECUTOR.submit(process_excel_update, file_id)
+    return True
+
+def check_excel_file(service, file_id):
+    """Reject files that are missing, too large or not Excel workbooks, using Drive metadata only."""
+    from googleapiclient.errors import HttpError
+
+    try:
+        file_metadata = service.files().get(
+            fileId=file_id,
+            fields='id,name,size,mimeType',
+            supportsAllDrives=True
+        ).execute(num_retries=DRIVE_RETRIES)
+    except HttpError as e:
+        if e.resp.status in (403, 404):
+            raise FileRejected(f"Unable to access file with ID {file_id}. Make sure the file exists and is shared with the service account.", 404)
+        raise
+
+    mime_type = (file_metadata.get('mimeType') or '').lower()
+    if mime_type not in EXCEL_MIME_TYPES and mime_type not in GENERIC_MIME_TYPES:
+        raise FileRejected(f"File {file_id} is not an Excel workbook (mimeType: {mime_type})", 415)
+
+    file_size = int(file_metadata.get('size', 0))
+    if file_size > MAX_XLSX_BYTES:
+        raise FileRejected(f"File {file_id} is too large to update: {file_size} bytes (limit {MAX_XLSX_BYTES})", 413)
+
+    return file_metadata
+
+def download_excel(service, file_id, fh):
+    """Download Excel file from Google Drive into a writable file-like object."""
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import MediaIoBaseDownload
+
     try:
         # Add support for shared drives
-        app.logger.info(f"About to download file with ID: '{file_id}'")
+        app.logger.debug("About to download file with ID: '%s'", file_id)
         
-        try:
-            file_metadata = service.files().get(
-                fileId=file_id,
-                supportsAllDrives=True
-            ).execute()
-            app.logger.info(f"File exists, name: {file_metadata.get('name')}")
-        except Exception as e:
-            app.logger.error(f"File metadata check failed: {str(e)}")
-            raise ValueError(f"Unable to access file with ID {file_id}. Make sure the file exists and is shared with the service account.")
-            
         request = service.files().get_media(
             fileId=file_id,
             supportsAllDrives=True
         )
         
-        # Use context manager to ensure file is properly closed
-        with open(download_path, 'wb') as fh:
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
+        # A missing or unshared file surfaces as an error on the first chunk
+        downloader = MediaIoBaseDownload(fh, request, chunksize=TRANSFER_CHUNK_SIZE)
+        done = False
+        try:
             while not done:
-                status, done = downloader.next_chunk()
-                app.logger.info(f"Download progress: {int(status.progress() * 100)}%")
+                status, done = downloader.next_chunk(num_retries=DRIVE_RETRIES)
+                app.logger.debug("Download progress: %d%%", int(status.progress() * 100))
+        except HttpError as e:
+            if e.resp.status in (403, 404):
+                raise ValueError(f"Unable to access file with ID {file_id}. Make sure the file exists and is shared with the service account.")
+            raise
                 
         # Verify file is valid
-        downloaded_size = os.path.getsize(download_path)
-        app.logger.info(f"Downloaded file size: {downloaded_size} bytes")
+        downloaded_size = fh.tell()
+        app.logger.debug("Downloaded file size: %d bytes", downloaded_size)
         if downloaded_size < 5000:  # Adjust minimum expected size as needed
             raise ValueError(f"Downloaded file appears corrupt (too small): {downloaded_size} bytes")
             
         return True
     except Exception as e:
-        app.logger.error(f"Download error: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        app.logger.error("Download error: %s", e)
         raise
 
-def update_excel(path, input_data):
-    """Update specific cells in the Excel workbook based on input data."""
-    try:
-        wb = openpyxl.load_workbook(path, keep_vba=True, data_only=True)
-        
-        # Check if the required sheet exists
-        if 'Project Setup Form' not in wb.sheetnames:
-            raise Exception("Required sheet 'Project Setup Form' not found in the Excel file")
-            
-        sheet = wb['Project Setup Form']
+def find_sheet_part(zf, sheet_name):
+    """Resolve a sheet name to the path of its worksheet XML inside the xlsx zip."""
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    rel_id = None
+    for sheet in workbook.iter(f'{{{SPREADSHEET_NS}}}sheet'):
+        if sheet.get('name') == sheet_name:
+            rel_id = sheet.get(f'{{{RELATIONSHIP_NS}}}id')
+            break
+    if rel_id is None:
+        raise Exception(f"Required sheet '{sheet_name}' not found in the Excel file")
 
-        # Check if we have any mappable data
-        updates_count = 0
-        for field in EXCEL_CELL_MAP.keys():
-            if field in input_data and input_data[field]:
-                updates_count += 1
-                
-        if updates_count == 0:
+    rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels.iter(f'{{{PACKAGE_RELS_NS}}}Relationship'):
+        if rel.get('Id') == rel_id:
+            target = rel.get('Target')
+            if target.startswith('/'):
+                return target.lstrip('/')
+            return posixpath.normpath(posixpath.join('xl', target))
+    raise Exception(f"Worksheet for sheet '{sheet_name}' not found in the Excel file")
+
+def patch_sheet_xml(sheet_xml, updates):
+    """
+    Rewrite cells of a worksheet XML document with new values, keeping their style.
+    Returns None if a cell is missing or holds a formula, as those need openpyxl.
+    Raises ValueError for values that cannot be written, as openpyxl would.
+    """
+    patched = set()
+
+    def replace_cell(match):
+        cell_ref, cell = match.group(1), match.group(0)
+        if cell_ref not in updates or '<f' in cell:
+            return cell
+
+        patched.add(cell_ref)
+        value = updates[cell_ref]
+        style = CELL_STYLE_PATTERN.search(CELL_OPEN_TAG_PATTERN.match(cell).group(0))
+        style_attr = style.group(0) if style else ''
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            if not math.isfinite(value):
+                raise ValueError(f"Cannot write non-finite number {value} to cell {cell_ref}")
+            return f'<c r="{cell_ref}"{style_attr}><v>{value}</v></c>'
+
+        text = str(value)
+        if ILLEGAL_CHARACTERS_PATTERN.search(text):
+            raise ValueError(f"Value for cell {cell_ref} contains characters that cannot be written to an Excel file")
+        # Excel trims leading and trailing whitespace unless told to preserve it
+        space_attr = ' xml:space="preserve"' if text != text.strip() else ''
+        return f'<c r="{cell_ref}"{style_attr} t="inlineStr"><is><t{space_attr}>{escape(text)}</t></is></c>'
+
+    # One pass over the sheet rewrites every target cell
+    sheet_xml = CELL_PATTERN.sub(replace_cell, sheet_xml)
+    if patched != updates.keys():
+        return None
+    return sheet_xml
+
+def patch_workbook(buf, updates):
+    """
+    Patch cells directly inside the xlsx zip, copying every other part (including VBA) unchanged.
+    Returns the patched workbook buffer, or None if the cells could not be patched directly.
+    """
+    out = io.BytesIO()
+    with zipfile.ZipFile(buf, 'r') as zin:
+        sheet_part = find_sheet_part(zin, SHEET_NAME)
+        sheet_xml = patch_sheet_xml(zin.read(sheet_part).decode('utf-8'), updates)
+        if sheet_xml is None:
+            return None
+
+        with zipfile.ZipFile(out, 'w') as zout:
+            for item in zin.infolist():
+                if item.filename == sheet_part:
+                    data = sheet_xml.encode('utf-8')
+                else:
+                    data = zin.read(item)
+                    if item.filename.lower().endswith(PRECOMPRESSED_SUFFIXES):
+                        item.compress_type = zipfile.ZIP_STORED
+                zout.writestr(item, data, compresslevel=1)
+
+    out.seek(0)
+    return out
+
+def update_with_openpyxl(buf, updates):
+    """Apply updates by loading and re-saving the whole workbook with openpyxl."""
+    import openpyxl
+    from openpyxl.utils.cell import coordinate_to_tuple
+
+    # keep_vba makes openpyxl hold on to the source archive, so only use it when there are parts to carry over
+    with zipfile.ZipFile(buf) as zf:
+        keep_vba = any(KEEP_VBA_PART_PATTERN.match(name) for name in zf.namelist())
+    buf.seek(0)
+
+    wb = openpyxl.load_workbook(buf, keep_vba=keep_vba, data_only=True)
+
+    # Check if the required sheet exists
+    if SHEET_NAME not in wb.sheetnames:
+        raise Exception(f"Required sheet '{SHEET_NAME}' not found in the Excel file")
+
+    sheet = wb[SHEET_NAME]
+
+    # Apply all updates straight to the (top-left) cells, skipping the range lookup done by sheet[ref]
+    for cell_ref, value in updates.items():
+        row, column = coordinate_to_tuple(cell_ref)
+        sheet.cell(row=row, column=column).value = value
+
+    # Save the workbook
+    out = io.BytesIO()
+    wb.save(out)
+
+    # Explicitly close the workbook
+    wb.close()
+
+    # In debug mode, CRC-check the saved zip rather than parsing the whole workbook again
+    if app.debug:
+        with zipfile.ZipFile(out) as zf:
+            bad_member = zf.testzip()
+        if bad_member is not None:
+            raise ValueError(f"Excel file appears to be corrupted after save operation: bad member {bad_member}")
+        app.logger.debug("File verification successful")
+
+    out.seek(0)
+    return out
+
+def update_excel(buf, input_data):
+    """
+    Update specific cells in the Excel workbook based on input data.
+    Returns a buffer with the updated workbook, or None if there was nothing to update.
+    """
+    try:
+        # Collect the mappable data, bailing out before the workbook is opened if there is none
+        updates = {cell_ref: input_data[field] for field, cell_ref in EXCEL_CELL_MAP if input_data.get(field)}
+        if not updates:
             app.logger.warning("No mappable data found in input. Nothing to update.")
-            return False
+            return None
 
-        # Create updates dictionary from input data
-        updates = {}
-        for field, cell_ref in EXCEL_CELL_MAP.items():
-            if field in input_data and input_data[field]:
-                updates[cell_ref] = input_data[field]
-                app.logger.info(f"Updating {field} in cell {cell_ref} with value: {input_data[field]}")
+        if app.logger.isEnabledFor(logging.DEBUG):
+            for cell_ref, value in updates.items():
+                app.logger.debug("Updating cell %s with value: %s", cell_ref, value)
 
-        # Apply all updates
-        for cell_ref, value in updates.items():
-            sheet[cell_ref] = value
+        # Patch the sheet XML directly, falling back to a full openpyxl rewrite
+        updated = None
+        if EXCEL_UPDATE_ENGINE != 'openpyxl':
+            buf.seek(0)
+            updated = patch_workbook(buf, updates)
+            if updated is None:
+                app.logger.info("Cells could not be patched in place, falling back to openpyxl")
+        if updated is None:
+            buf.seek(0)
+            updated = update_with_openpyxl(buf, updates)
 
-        # Save the workbook
-        wb.save(path)
-        
-        # Explicitly close the workbook
-        wb.close()
-        
-        # Verify file was saved properly
-        try:
-            verify_wb = openpyxl.load_workbook(path, keep_vba=True, data_only=True)
-            verify_wb.close()
-            app.logger.info(f"File verification successful: {path}")
-        except Exception as e:
-            app.logger.error(f"File verification failed: {str(e)}")
-            raise ValueError(f"Excel file appears to be corrupted after save operation: {str(e)}")
-        
-        return True
+        return updated
         
     except Exception as e:
-        app.logger.error(f"Excel update error: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        app.logger.error("Excel update error: %s", e)
         raise
 
-def upload_excel(service, file_id, path):
-    """Upload updated Excel file back to Google Drive with timeout handling."""
-    try:
-        # Add support for shared drives
-        file_metadata = service.files().get(
-            fileId=file_id, 
-            supportsAllDrives=True
-        ).execute()
-        app.logger.info(f"File metadata before upload: {file_metadata}")
-        app.logger.info(f"File ID being used for API call: '{file_id}'")
+def upload_excel(service, file_id, buf):
+    """Upload updated Excel workbook buffer back to Google Drive."""
+    from googleapiclient.http import MediaIoBaseUpload
 
+    try:
         # Log file details
-        file_size = os.path.getsize(path)
-        app.logger.info(f"Local file size: {file_size} bytes")
+        file_size = buf.getbuffer().nbytes
+        app.logger.debug("Workbook size: %d bytes", file_size)
 
         # Check if file appears valid
         if file_size < 5000:
             raise ValueError(f"File appears too small to be a valid Excel file: {file_size} bytes")
 
-        # Use smaller chunk size for uploads
-        media = MediaFileUpload(
-            path,
+        # Small workbooks go up in one request; only large ones need a resumable session
+        resumable = file_size >= RESUMABLE_UPLOAD_THRESHOLD
+        media = MediaIoBaseUpload(
+            buf,
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            resumable=True,
-            chunksize=512*1024  # Reduce to 512KB chunks
+            resumable=resumable,
+            chunksize=TRANSFER_CHUNK_SIZE
         )
         
-        app.logger.info(f"Attempting chunked upload")
-        app.logger.info(f"Attempting to upload file to ID: {file_id}")
+        app.logger.debug("Attempting to upload file to ID: %s", file_id)
 
         request = service.files().update(
             fileId=file_id,
@@ -204,33 +519,54 @@ def upload_excel(service, file_id, path):
             supportsAllDrives=True
         )
         
-        response = None
-        while response is None:
-            status, response = request.next_chunk()
-            if status:
-                app.logger.info(f"Upload progress: {int(status.progress() * 100)}%")
+        # execute() sends small files in one multipart request and drives the chunk loop for resumable ones
+        response = request.execute(num_retries=DRIVE_RETRIES)
         
-        app.logger.info(f"Upload successful. Updated file details: {response}")
+        app.logger.debug("Upload successful. Updated file details: %s", response)
         return response
     except Exception as e:
-        app.logger.error(f"Upload error: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        app.logger.error("Upload error: %s", e)
         raise
 
+def run_excel_update(file_id, data):
+    """
+    Download a workbook from Google Drive, apply the mapped updates and upload it back.
+    Returns True if the workbook was updated, False if there was nothing to update.
+    """
+    # Updates to the same file must not overlap, or one upload would overwrite the other;
+    # the lock is per process, so this only holds when a single worker process serves the app
+    with file_lock(file_id):
+        start_time = time.time()
+        
+        # Get the shared Google Drive service
+        service = get_service()
+        
+        # Reject oversized or non-Excel files before downloading them
+        if MAX_XLSX_BYTES:
+            check_excel_file(service, file_id)
+        
+        # Download the file into memory
+        buf = io.BytesIO()
+        download_excel(service, file_id, buf)
+        app.logger.debug("Download completed in %.2f seconds", time.time() - start_time)
+        
+        # Update the Excel file
+        updated = update_excel(buf, data)
+        app.logger.debug("Excel update completed in %.2f seconds", time.time() - start_time)
+        
+        if updated is not None:
+            # Upload the updated file
+            upload_excel(service, file_id, updated)
+            app.logger.debug("Upload completed in %.2f seconds", time.time() - start_time)
+            
+        app.logger.info("Processed file %s (%d bytes) in %.2f seconds", file_id, buf.getbuffer().nbytes, time.time() - start_time)
+        return updated is not None
+
 @app.route('/', methods=['GET', 'POST'])
 def root():
     """Root endpoint that handles webhook requests from Zapier"""
     if request.method == 'POST':
         try:
-            start_time = time.time()
-            app.logger.info("Received webhook request")
-            
-            # Debug logging for request inspection
-            raw_data = request.get_data(as_text=True)
-            app.logger.info(f"Raw request data: {raw_data}")
-            app.logger.info(f"Request form: {request.form}")
-            app.logger.info(f"Request headers: {dict(request.headers)}")
-            
             # Parse request data
             data = parse_request_data(request)
             
@@ -243,10 +579,24 @@ def root():
             if not file_id:
                 return jsonify({"status": "error", "message": "No file ID provided"}), 400
 
-            app.logger.info(f"Original file ID received: '{file_id}'")
+            app.logger.debug("Original file ID received: '%s'", file_id)
+            
+            # Zapier may deliver the same webhook more than once; only process it the first time
+            key = webhook_key(file_id, data)
+            if is_duplicate_webhook(key):
+                app.logger.info("Ignoring duplicate webhook for file ID: %s", file_id)
+                return jsonify({
+                    "status": "accepted",
+                    "message": "Duplicate request already accepted for processing"
+                })
             
-            # Start processing in background
-            Thread(target=process_excel_update, args=(file_id, data)).start()
+            # Queue processing on the background worker pool
+            if not queue_excel_update(file_id, data, key):
+                app.logger.info("Merged webhook into pending update for file ID: %s", file_id)
+                return jsonify({
+                    "status": "accepted",
+                    "message": "Request merged into pending update"
+                })
             
             # Immediately return success to Zapier
             return jsonify({
@@ -255,8 +605,7 @@ def root():
             })
             
         except Exception as e:
-            app.logger.error(f"Error processing webhook request: {str(e)}")
-            app.logger.error(traceback.format_exc())
+            app.logger.exception("Error processing webhook request")
             return jsonify({"status": "error", "message": str(e)}), 500
     
     # Handle GET requests (like health checks)
@@ -268,7 +617,7 @@ def update_excel_api():
     try:
         # Get the JSON data from the request
         data = request.json
-        app.logger.info(f"Received request with data: {data}")
+        app.logger.debug("Received request with data: %s", data)
         
         # Validate the input
         if not data:
@@ -279,39 +628,19 @@ def update_excel_api():
         if not file_id:
             return jsonify({"status": "error", "message": "No file ID provided"}), 400
             
-        # Set up temporary file path
-        temp_file = f"/tmp/{file_id}.xlsx"
-        
-        # Authenticate with Google Drive
-        creds = authenticate()
-        service = build('drive', 'v3', credentials=creds)
-        
-        # Download the file
-        download_excel(service, file_id, temp_file)
-        
-        # Update the Excel file
-        update_success = update_excel(temp_file, data)
-        
-        if update_success:
-            # Upload the updated file
-            upload_excel(service, file_id, temp_file)
-            
-        # Clean up
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
+        update_success = run_excel_update(file_id, data)
             
         return jsonify({
             "status": "success",
             "message": "Excel file updated successfully" if update_success else "No updates were made"
         })
         
+    except FileRejected as e:
+        app.logger.warning(str(e))
+        return jsonify({"status": "error", "message": str(e)}), e.status_code
+
     except Exception as e:
-        app.logger.error(f"Error processing request: {str(e)}")
-        app.logger.error(traceback.format_exc())
-        
-        # Clean up in case of error
-        if 'temp_file' in locals() and os.path.exists(temp_file):
-            os.remove(temp_file)
+        app.logger.exception("Error processing request")
             
         return jsonify({
             "status": "error",
@@ -321,21 +650,19 @@ def update_excel_api():
 @app.route('/test_file_access', methods=['GET'])
 def test_file_access():
     file_id = request.args.get('file_id')
-    app.logger.info(f"Testing file access for ID: '{file_id}'")
+    app.logger.info("Testing file access for ID: '%s'", file_id)
     try:
-        creds = authenticate()
-        service = build('drive', 'v3', credentials=creds)
+        service = get_service()
         file_metadata = service.files().get(fileId=file_id, supportsAllDrives=True).execute()
         return jsonify({"success": True, "file_name": file_metadata.get('name')})
     except Exception as e:
-        app.logger.error(f"Test file access error: {str(e)}")
+        app.logger.error("Test file access error: %s", e)
         return jsonify({"success": False, "error": str(e)})
 
 @app.route('/list_files', methods=['GET'])
 def list_files():
     try:
-        creds = authenticate()
-        service = build('drive', 'v3', credentials=creds)
+        service = get_service()
         results = service.files().list(
             pageSize=10,
             fields="files(id, name)",
@@ -345,56 +672,35 @@ def list_files():
         files = results.get('files', [])
         return jsonify({"files": files})
     except Exception as e:
-        app.logger.error(f"List files error: {str(e)}")
+        app.logger.error("List files error: %s", e)
         return jsonify({"error": str(e)})
 
 @app.route('/test_connection', methods=['GET'])
 def test_connection():
     try:
-        creds = authenticate()
-        service = build('drive', 'v3', credentials=creds)
+        service = get_service()
         # Just list a few files to test connectivity
         results = service.files().list(pageSize=5).execute()
         return jsonify({"status": "success", "message": "Google Drive connection successful"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)})
 
-def process_excel_update(file_id, data):
-    """Background process to handle the Excel update"""
-    try:
-        app.logger.info(f"Starting background processing for file ID: {file_id}")
-        start_time = time.time()
-        
-        temp_file = f"/tmp/{file_id}.xlsx"
-        
-        # Authenticate with Google Drive
-        creds = authenticate()
-        service = build('drive', 'v3', credentials=creds)
-        
-        # Download the file
-        download_excel(service, file_id, temp_file)
-        app.logger.info(f"Download completed in {time.time() - start_time:.2f} seconds")
-        
-        # Update the Excel file
-        update_success = update_excel(temp_file, data)
-        app.logger.info(f"Excel update completed in {time.time() - start_time:.2f} seconds")
-        
-        if update_success:
-            # Upload the updated file
-            upload_excel(service, file_id, temp_file)
-            app.logger.info(f"Upload completed in {time.time() - start_time:.2f} seconds")
-            
-        # Clean up
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
-            
-        end_time = time.time()
-        app.logger.info(f"Background processing completed for file {file_id} in {end_time - start_time:.2f} seconds")
-    except Exception as e:
-        app.logger.error(f"Background processing error: {str(e)}")
-        app.logger.error(traceback.format_exc())
-        if 'temp_file' in locals() and os.path.exists(temp_file):
-            os.remove(temp_file)
+def process_excel_update(file_id):
+    """Background process to handle the queued Excel update for a file"""
+    # Wait for any running update to the file, so webhooks arriving meanwhile are merged into this one
+    with file_lock(file_id):
+        with _PENDING_LOCK:
+            data, keys = _PENDING.pop(file_id)
+        try:
+            app.logger.debug("Starting background processing for file ID: %s (%d webhooks)", file_id, len(keys))
+            run_excel_update(file_id, data)
+        except FileRejected as e:
+            app.logger.warning(str(e))
+        except Exception:
+            app.logger.exception("Background processing error")
+            # Allow retries of the same webhooks to run again
+            for key in keys:
+                forget_webhook(key)
 
 def verify_excel_file(file_path):
     with open(file_path, 'rb') as f:
@@ -403,18 +709,14 @@ def verify_excel_file(file_path):
     # Excel files start with these bytes (PKZip format)
     valid_header = header == b'PK\x03\x04'
     
-    app.logger.info(f"Excel file header valid: {valid_header} for {file_path}")
+    app.logger.info("Excel file header valid: %s for %s", valid_header, file_path)
     return valid_header
 
-def diagnose_excel_file(file_path):
+def diagnose_excel_file(fh):
     """
-    Diagnose potential issues with an Excel file
+    Diagnose potential issues with an Excel file held in a seekable file-like object
     Returns information about the file structure
     """
-    import os
-    import zipfile
-    import xml.etree.ElementTree as ET
-    
     results = {
         "file_exists": False,
         "file_size": 0,
@@ -429,19 +731,15 @@ def diagnose_excel_file(file_path):
     
     try:
         # Basic file checks
-        if not os.path.exists(file_path):
-            results["errors"].append("File does not exist")
-            return results
-            
         results["file_exists"] = True
-        results["file_size"] = os.path.getsize(file_path)
+        results["file_size"] = fh.seek(0, io.SEEK_END)
         
         if results["file_size"] < 2000:
             results["errors"].append(f"File too small: {results['file_size']} bytes")
         
         # Check if it's a valid ZIP file
         try:
-            with zipfile.ZipFile(file_path, 'r') as zip_ref:
+            with zipfile.ZipFile(fh, 'r') as zip_ref:
                 results["is_valid_zip"] = True
                 file_list = zip_ref.namelist()
                 
@@ -501,12 +799,8 @@ def diagnose_endpoint():
         return jsonify({"error": "No file_id provided"}), 400
         
     try:
-        # Set up temporary file path
-        temp_file = f"/tmp/{file_id}_diagnostic.xlsx"
-        
-        # Authenticate with Google Drive
-        creds = authenticate()
-        service = build('drive', 'v3', credentials=creds)
+        # Get the shared Google Drive service
+        service = get_service()
         
         # Get file metadata
         file_metadata = service.files().get(
@@ -515,9 +809,10 @@ def diagnose_endpoint():
             supportsAllDrives=True
         ).execute()
         
-        # Download the file
+        # Download the file into memory
+        fh = io.BytesIO()
         try:
-            download_excel(service, file_id, temp_file)
+            download_excel(service, file_id, fh)
             download_success = True
         except Exception as e:
             download_success = False
@@ -525,11 +820,7 @@ def diagnose_endpoint():
         
         # Run diagnostics
         if download_success:
-            diagnostic_results = diagnose_excel_file(temp_file)
-            
-            # Clean up
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+            diagnostic_results = diagnose_excel_file(fh)
                 
             return jsonify({
                 "file_metadata": file_metadata,
@@ -544,16 +835,13 @@ def diagnose_endpoint():
             }), 500
             
     except Exception as e:
-        app.logger.error(f"Diagnostic error: {str(e)}")
-        
-        # Clean up in case of error
-        if 'temp_file' in locals() and os.path.exists(temp_file):
-            os.remove(temp_file)
+        app.logger.error("Diagnostic error: %s", e)
             
         return jsonify({
             "error": str(e)
         }), 500
 
 if __name__ == '__main__':
-    # For local development only - use proper WSGI server in production
+    # For local development only - production runs under gunicorn (see Procfile)
+    app.logger.warning("Starting the Flask development server; use 'gunicorn -c gunicorn.conf.py api.app:app' in production")
     app.run(debug=False, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
\ No newline at end of file
@@ -0,0 +1,15 @@
+import os
+
+# Gunicorn settings for production: threaded workers so concurrent Drive round trips overlap
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+# One process by default: per-file locking, webhook merging and dedupe are held in process memory,
+# so deliveries for the same file landing on different workers would race again.
+# Read from GUNICORN_WORKERS rather than WEB_CONCURRENCY, which hosting platforms set on their own
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+worker_class = 'gthread'
+threads = 16
+timeout = 120
+keepalive = 75
+
+# Import the app once in the master so workers share it copy-on-write
+preload_app = True
@@ -0,0 +1,72 @@
+import unittest
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from api.app import MAX_XLSX_BYTES, FileRejected, check_excel_file
+
+
+class StubService:
+    """Drive service stand-in whose files().get().execute() returns fixed metadata or raises."""
+
+    def __init__(self, metadata=None, error=None):
+        self.metadata = metadata
+        self.error = error
+
+    def files(self):
+        return self
+
+    def get(self, **kwargs):
+        return self
+
+    def execute(self, num_retries=0):
+        if self.error is not None:
+            raise self.error
+        return self.metadata
+
+
+def http_error(status):
+    return HttpError(httplib2.Response({'status': status}), b'{}')
+
+
+class CheckExcelFileTest(unittest.TestCase):
+
+    def check(self, mime_type, size=1000):
+        return check_excel_file(StubService({'mimeType': mime_type, 'size': str(size)}), 'f')
+
+    def test_accepts_workbook_types(self):
+        for mime_type in ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                          'application/vnd.ms-excel.sheet.macroEnabled.12',
+                          'application/vnd.ms-excel.sheet.macroenabled.12',
+                          'Application/Vnd.OpenXmlFormats-OfficeDocument.SpreadsheetML.Sheet'):
+            self.assertEqual(self.check(mime_type)['mimeType'], mime_type)
+
+    def test_accepts_generic_type(self):
+        self.assertEqual(self.check('application/octet-stream')['size'], '1000')
+
+    def test_rejects_other_types(self):
+        for mime_type in ('application/pdf', 'application/vnd.google-apps.spreadsheet', None):
+            with self.assertRaises(FileRejected) as cm:
+                self.check(mime_type)
+            self.assertEqual(cm.exception.status_code, 415)
+
+    def test_rejects_oversized_files(self):
+        for mime_type in ('application/vnd.ms-excel.sheet.macroenabled.12', 'application/octet-stream'):
+            with self.assertRaises(FileRejected) as cm:
+                self.check(mime_type, MAX_XLSX_BYTES + 1)
+            self.assertEqual(cm.exception.status_code, 413)
+
+    def test_inaccessible_file(self):
+        for status in (403, 404):
+            with self.assertRaises(FileRejected) as cm:
+                check_excel_file(StubService(error=http_error(status)), 'f')
+            self.assertEqual(cm.exception.status_code, 404)
+            self.assertIn('Unable to access file with ID f', str(cm.exception))
+
+    def test_other_errors_propagate(self):
+        with self.assertRaises(HttpError):
+            check_excel_file(StubService(error=http_error(500)), 'f')
+
+
+if __name__ == '__main__':
+    unittest.main()
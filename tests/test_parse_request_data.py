@@ -0,0 +1,32 @@
+import unittest
+
+from flask import request
+
+from api.app import app, parse_request_data
+
+
+class ParseRequestDataTest(unittest.TestCase):
+
+    def parse(self, body, content_type):
+        with app.test_request_context('/', method='POST', data=body, content_type=content_type):
+            return parse_request_data(request)
+
+    def test_json(self):
+        self.assertEqual(self.parse('{"projectName": "A"}', 'application/json'), {'projectName': 'A'})
+
+    def test_json_suffix_type(self):
+        self.assertEqual(self.parse('{"projectName": "A"}', 'application/vnd.api+json'), {'projectName': 'A'})
+
+    def test_form(self):
+        self.assertEqual(self.parse('projectName=A&branch=B', 'application/x-www-form-urlencoded'),
+                         {'projectName': 'A', 'branch': 'B'})
+
+    def test_url_encoded_text(self):
+        self.assertEqual(self.parse('projectName=A+B', 'text/plain'), {'projectName': 'A B'})
+
+    def test_url_encoded_sent_as_json(self):
+        self.assertEqual(self.parse('projectName=A&branch=B', 'application/json'), {'projectName': 'A', 'branch': 'B'})
+
+
+if __name__ == '__main__':
+    unittest.main()
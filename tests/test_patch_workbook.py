@@ -0,0 +1,83 @@
+import io
+import unittest
+
+import openpyxl
+from openpyxl.styles import Font
+
+from api.app import SHEET_NAME, patch_sheet_xml, patch_workbook, update_excel
+
+
+def build_workbook():
+    """Build a workbook with the target sheet, styled and merged target cells and a formula."""
+    wb = openpyxl.Workbook()
+    wb.active.title = 'Other'
+    sheet = wb.create_sheet(SHEET_NAME)
+    for cell_range in ('D29:G29', 'D8:F8', 'D6:G6'):
+        sheet.merge_cells(cell_range)
+    sheet['D29'] = 'old name'
+    sheet['D29'].font = Font(bold=True)
+    sheet['D8'] = 5
+    sheet['D6'] = 'old branch'
+    sheet['A1'] = '=D8*2'
+    # Pad the workbook past the minimum size checks
+    for row in range(1, 300):
+        sheet.cell(row=40 + row, column=1, value=f'filler {row}')
+
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
+
+
+def build_empty_workbook():
+    """Build a workbook whose target sheet has none of the target cells."""
+    wb = openpyxl.Workbook()
+    wb.active.title = SHEET_NAME
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
+
+
+def reload_sheet(buf):
+    return openpyxl.load_workbook(buf)[SHEET_NAME]
+
+
+class PatchWorkbookTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        updates = {'D29': 'A & <B>', 'D8': 123, 'D6': '  North '}
+        out = patch_workbook(build_workbook(), updates)
+        self.assertIsNotNone(out)
+
+        sheet = reload_sheet(out)
+        self.assertEqual(sheet['D29'].value, 'A & <B>')
+        self.assertTrue(sheet['D29'].font.b)
+        self.assertEqual(sheet['D8'].value, 123)
+        self.assertEqual(sheet['D6'].value, '  North ')
+        self.assertEqual(sheet['A1'].value, '=D8*2')
+        self.assertEqual(sheet['A41'].value, 'filler 1')
+
+    def test_preserves_surrounding_whitespace(self):
+        sheet_xml = patch_sheet_xml('<row r="6"><c r="D6" s="3"/></row>', {'D6': ' North'})
+        self.assertEqual(sheet_xml, '<row r="6"><c r="D6" s="3" t="inlineStr"><is><t xml:space="preserve"> North</t></is></c></row>')
+
+    def test_missing_cell_needs_openpyxl(self):
+        self.assertIsNone(patch_workbook(build_empty_workbook(), {'D6': 'North'}))
+
+    def test_missing_cell_falls_back_to_openpyxl(self):
+        out = update_excel(build_empty_workbook(), {'branch': 'North'})
+        self.assertEqual(reload_sheet(out)['D6'].value, 'North')
+
+    def test_rejects_illegal_characters(self):
+        with self.assertRaises(ValueError):
+            patch_workbook(build_workbook(), {'D6': 'a\x0bb'})
+
+    def test_rejects_non_finite_numbers(self):
+        for value in (float('nan'), float('inf')):
+            with self.assertRaises(ValueError):
+                patch_workbook(build_workbook(), {'D8': value})
+
+
+if __name__ == '__main__':
+    unittest.main()
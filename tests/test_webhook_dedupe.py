@@ -0,0 +1,51 @@
+import time
+import unittest
+from unittest import mock
+
+from api import app as app_module
+from api.app import DUPLICATE_WEBHOOK_TTL, forget_webhook, is_duplicate_webhook, webhook_key
+
+
+def key(project_name, file_id='f'):
+    return webhook_key(file_id, {'Current File ID': file_id, 'projectName': project_name})
+
+
+class WebhookDedupeTest(unittest.TestCase):
+
+    def setUp(self):
+        app_module._RECENT_WEBHOOKS.clear()
+
+    def test_exact_repeat_is_dropped(self):
+        self.assertFalse(is_duplicate_webhook(key('A')))
+        self.assertTrue(is_duplicate_webhook(key('A')))
+
+    def test_change_back_to_earlier_values_runs(self):
+        self.assertEqual([is_duplicate_webhook(key(name)) for name in 'ABA'], [False, False, False])
+
+    def test_files_are_tracked_separately(self):
+        self.assertFalse(is_duplicate_webhook(key('A', 'f')))
+        self.assertFalse(is_duplicate_webhook(key('A', 'g')))
+        self.assertTrue(is_duplicate_webhook(key('A', 'f')))
+
+    def test_repeat_runs_again_after_ttl(self):
+        now = time.monotonic()
+        with mock.patch.object(app_module.time, 'monotonic', return_value=now):
+            self.assertFalse(is_duplicate_webhook(key('A')))
+        with mock.patch.object(app_module.time, 'monotonic', return_value=now + DUPLICATE_WEBHOOK_TTL + 1):
+            self.assertFalse(is_duplicate_webhook(key('A')))
+            self.assertTrue(is_duplicate_webhook(key('A')))
+
+    def test_forget_allows_retry(self):
+        self.assertFalse(is_duplicate_webhook(key('A')))
+        forget_webhook(key('A'))
+        self.assertFalse(is_duplicate_webhook(key('A')))
+
+    def test_forget_keeps_newer_delivery(self):
+        self.assertFalse(is_duplicate_webhook(key('A')))
+        self.assertFalse(is_duplicate_webhook(key('B')))
+        forget_webhook(key('A'))
+        self.assertTrue(is_duplicate_webhook(key('B')))
+
+
+if __name__ == '__main__':
+    unittest.main()
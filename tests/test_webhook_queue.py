@@ -0,0 +1,61 @@
+import threading
+import unittest
+from unittest import mock
+
+from api import app as app_module
+
+
+class WebhookQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        app_module._RECENT_WEBHOOKS.clear()
+        self.client = app_module.app.test_client()
+        self.runs = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.finished = threading.Semaphore(0)
+        self.process_excel_update = app_module.process_excel_update
+
+    def fake_run_excel_update(self, file_id, data):
+        """Record the update, holding the first one until the test releases it."""
+        self.runs.append((file_id, dict(data)))
+        self.started.set()
+        self.release.wait(5)
+        return True
+
+    def tracked_process_excel_update(self, file_id):
+        """Run the real background job, signalling once it has fully finished."""
+        try:
+            self.process_excel_update(file_id)
+        finally:
+            self.finished.release()
+
+    def post(self, **data):
+        response = self.client.post('/', data={'Current File ID': 'f', **data})
+        self.assertEqual(response.status_code, 200)
+        return response.json['message']
+
+    def test_merges_webhooks_queued_behind_running_update(self):
+        with mock.patch.object(app_module, 'run_excel_update', self.fake_run_excel_update), \
+                mock.patch.object(app_module, 'process_excel_update', self.tracked_process_excel_update):
+            self.assertEqual(self.post(projectName='A'), 'Request accepted for processing')
+            self.assertTrue(self.started.wait(5))
+
+            # The first update is running, so the second is queued and the third merged into it
+            self.assertEqual(self.post(projectName='B', projectNumber='1'), 'Request accepted for processing')
+            self.assertEqual(self.post(projectName='C', projectNumber=''), 'Request merged into pending update')
+
+            self.release.set()
+            for _ in range(2):
+                self.assertTrue(self.finished.acquire(timeout=5))
+
+        self.assertEqual(self.runs, [
+            ('f', {'Current File ID': 'f', 'projectName': 'A'}),
+            ('f', {'Current File ID': 'f', 'projectName': 'C', 'projectNumber': '1'})
+        ])
+        self.assertEqual(app_module._PENDING, {})
+        self.assertEqual(app_module._FILE_LOCKS, {})
+
+
+if __name__ == '__main__':
+    unittest.main()